@@ -2,7 +2,8 @@ import asyncio
 import datetime
 import enum
 
-from sqlalchemy import ForeignKey, func, Text
+from sqlalchemy import Enum as SAEnum
+from sqlalchemy import ForeignKey, Index, column, event, func, table, Text
 from sqlalchemy.ext.asyncio import AsyncAttrs
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
 
@@ -34,18 +35,58 @@ class UsersORM(Base):
 
 class GoodsORM(Base):
     __tablename__ = "goods"
+    __table_args__ = (
+        Index("ix_goods_category_condition", "category", "condition"),
+        Index("ix_goods_user_id", "user_id"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
     title: Mapped[str]
     description: Mapped[str]
     image_url: Mapped[str | None]
     category: Mapped[str]
-    condition: Mapped[ConditionsGoods] = mapped_column(default=ConditionsGoods.new)
+    condition: Mapped[ConditionsGoods] = mapped_column(
+        SAEnum(ConditionsGoods, native_enum=False, length=16, validate_strings=False),
+        default=ConditionsGoods.new,
+    )
     created_at: Mapped[datetime.datetime] = mapped_column(server_default=func.now())
 
     user_id: Mapped[int] = mapped_column(ForeignKey("users.id"))
 
 
+# Полнотекстовый индекс по title/description, синхронизируется триггерами
+goods_fts = table("goods_fts", column("rowid"))
+
+GOODS_FTS_DDL = (
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS goods_fts USING fts5(
+        title, description, content='goods', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS goods_fts_ai AFTER INSERT ON goods BEGIN
+        INSERT INTO goods_fts(rowid, title, description)
+        VALUES (new.id, new.title, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS goods_fts_ad AFTER DELETE ON goods BEGIN
+        INSERT INTO goods_fts(goods_fts, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS goods_fts_au AFTER UPDATE ON goods BEGIN
+        INSERT INTO goods_fts(goods_fts, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+        INSERT INTO goods_fts(rowid, title, description)
+        VALUES (new.id, new.title, new.description);
+    END
+    """,
+)
+
+
 class TradeORM(Base):
     __tablename__ = "trades"
 
@@ -53,12 +94,43 @@ class TradeORM(Base):
     ad_sender_id: Mapped[int] = mapped_column(ForeignKey("goods.id"))
     ad_receiver_id: Mapped[int] = mapped_column(ForeignKey("goods.id"))
     comment: Mapped[str] = mapped_column(Text)
-    status: Mapped[TradeStatus] = mapped_column(default=TradeStatus.pending)
+    status: Mapped[TradeStatus] = mapped_column(
+        SAEnum(TradeStatus, native_enum=False, length=16, validate_strings=False),
+        default=TradeStatus.pending,
+    )
 
     sender_id: Mapped[int] = mapped_column(ForeignKey("users.id"))
     receiver_id: Mapped[int] = mapped_column(ForeignKey("users.id"))
 
 
+@event.listens_for(Base.metadata, "after_create")
+def create_goods_fts(target, connection, **kw):
+    exists = connection.exec_driver_sql(
+        "SELECT 1 FROM sqlite_master WHERE name = 'goods_fts'"
+    ).first()
+    # Триггеры пересоздаются всегда: SQLite удаляет их вместе с таблицей goods
+    for statement in GOODS_FTS_DDL:
+        connection.exec_driver_sql(statement)
+    if not exists:
+        # Индексируем товары, добавленные до появления goods_fts
+        connection.exec_driver_sql(
+            "INSERT INTO goods_fts(goods_fts) VALUES ('rebuild')"
+        )
+
+
+@event.listens_for(Base.metadata, "after_create")
+def create_goods_indexes(target, connection, **kw):
+    # create_all создаёт индексы только вместе с новой таблицей goods
+    for index in GoodsORM.__table__.indexes:
+        index.create(connection, checkfirst=True)
+
+
+@event.listens_for(Base.metadata, "before_drop")
+def drop_goods_fts(target, connection, **kw):
+    # goods_fts не описана в metadata, и drop_all сам её не удалит
+    connection.exec_driver_sql("DROP TABLE IF EXISTS goods_fts")
+
+
 # Создание всех таблиц
 async def async_main():
     async with engine.begin() as conn:
@@ -1,147 +1,307 @@
+import hashlib
+import logging
+from itertools import product
+
+from cachetools import TTLCache
 from fastapi import HTTPException
+from redis.exceptions import RedisError
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from src.database.models import GoodsORM, UsersORM, TradeORM, TradeStatus
-from sqlalchemy import select, or_
-
-from src.models import Goods, GoodsOut, GoodsUpdate, TradeCreate, TradeOut
+from src.database.models import GoodsORM, UsersORM, TradeORM, TradeStatus, goods_fts
+from src.database.session import redis_client
+from sqlalchemy import bindparam, delete, insert, literal_column, select, update, or_
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from src.models import (
+    Goods,
+    GoodsOut,
+    GoodsOutList,
+    GoodsUpdate,
+    TradeCreate,
+    TradeOut,
+    TradeOutList,
+    UserAuth,
+)
+
+
+_GOODS_COLS = (
+    GoodsORM.id,
+    GoodsORM.title,
+    GoodsORM.description,
+    GoodsORM.image_url,
+    GoodsORM.category,
+    GoodsORM.condition,
+    GoodsORM.user_id,
+    GoodsORM.created_at,
+)
+
+GOODS_LIST_CACHE_TTL = 60
+GOOD_CACHE_TTL = 300
+
+# Пользователи по username для get_current_user/authenticate_user
+_user_cache = TTLCache(maxsize=4096, ttl=30)
+
+logger = logging.getLogger(__name__)
+
+
+def _goods_list_cache_key(category, condition, search, limit):
+    params = repr((category, condition, search, limit))
+    return "goods:" + hashlib.blake2b(params.encode()).hexdigest()
+
+
+# Кэш необязателен: при недоступном Redis запросы идут напрямую в БД
+async def _cache_get(key):
+    try:
+        return await redis_client.get(key)
+    except RedisError:
+        logger.warning("Redis get failed for %s", key, exc_info=True)
+        return None
+
+
+async def _cache_set(key, value, ttl):
+    try:
+        await redis_client.set(key, value, ex=ttl)
+    except RedisError:
+        logger.warning("Redis set failed for %s", key, exc_info=True)
+
+
+async def _invalidate_goods_cache(good_id: int | None = None):
+    if redis_client is None:
+        return
+    try:
+        if good_id is not None:
+            await redis_client.delete(f"good:{good_id}")
+        keys = [key async for key in redis_client.scan_iter(match="goods:*")]
+        if keys:
+            await redis_client.delete(*keys)
+    except RedisError:
+        # Запись уже закоммичена; устаревший кэш истечёт по TTL
+        logger.warning("Redis goods cache invalidation failed", exc_info=True)
 
 
 async def user_registration(username, hashed_password, db: AsyncSession):
-    new_user = UsersORM(username=username, hashed_password=hashed_password)
-    db.add(new_user)
+    query = (
+        sqlite_insert(UsersORM)
+        .values(username=username, hashed_password=hashed_password)
+        .on_conflict_do_nothing(index_elements=[UsersORM.username])
+        .returning(UsersORM.id)
+    )
+    user_id = await db.scalar(query)
+    if user_id is None:
+        raise HTTPException(
+            status_code=400, detail="Пользователь с таким именем уже существует"
+        )
     await db.commit()
-
-
-async def is_username_taken(username, db: AsyncSession):
-    query = select(UsersORM).filter(UsersORM.username == username)
-    response = await db.execute(query)
-    response = response.scalars().first()
-    return response is not None
+    return user_id
 
 
 async def get_user_by_username(username, db: AsyncSession):
-    query = select(UsersORM).filter(UsersORM.username == username)
+    if username in _user_cache:
+        return _user_cache[username]
+
+    query = select(UsersORM.id, UsersORM.username, UsersORM.hashed_password).where(
+        UsersORM.username == username
+    )
     response = await db.execute(query)
-    user = response.scalars().first()
+    row = response.first()
+    if row is None:
+        return None
+
+    user = UserAuth(*row)
+    _user_cache[username] = user
     return user
 
 
+async def update_password_hash(user: UserAuth, hashed_password, db: AsyncSession):
+    query = (
+        update(UsersORM)
+        .where(UsersORM.id == user.id)
+        .values(hashed_password=hashed_password)
+    )
+    await db.execute(query)
+    await db.commit()
+    _user_cache.pop(user.username, None)
+
+
 async def add_goods(goods: Goods, user_id: int, db: AsyncSession):
-    new_good = GoodsORM(
-        title=goods.title,
-        description=goods.description,
-        image_url=goods.image_url,
-        category=goods.category,
-        condition=goods.condition,
-        user_id=user_id,
+    query = (
+        insert(GoodsORM)
+        .values(**goods.model_dump(), user_id=user_id)
+        .returning(GoodsORM.id, GoodsORM.created_at)
     )
-    db.add(new_good)
-    await db.flush()
-    await db.refresh(new_good)
-    good_out = GoodsOut.model_validate(new_good)
+    new_good = (await db.execute(query)).one()
     await db.commit()
-    return good_out
+    await _invalidate_goods_cache()
+    return GoodsOut(
+        id=new_good.id,
+        created_at=new_good.created_at,
+        user_id=user_id,
+        **goods.model_dump(),
+    )
 
 
 async def get_goods_from_db(category, condition, search, limit, db: AsyncSession):
+    if redis_client is None:
+        rows = await _select_goods(category, condition, search, limit, db)
+        return GoodsOutList.validate_python(rows, from_attributes=True)
+
+    key = _goods_list_cache_key(category, condition, search, limit)
+    cached = await _cache_get(key)
+    if cached is not None:
+        return GoodsOutList.validate_json(cached)
+
+    rows = await _select_goods(category, condition, search, limit, db)
+    goods = GoodsOutList.validate_python(rows, from_attributes=True)
+    await _cache_set(key, GoodsOutList.dump_json(goods), GOODS_LIST_CACHE_TTL)
+    return goods
 
-    query = select(GoodsORM)
 
-    if category:
-        query = query.where(GoodsORM.category == category)
-    if condition:
-        query = query.where(GoodsORM.condition == condition)
-    if search:
-        search_pattern = f"%{search}%"
+def _build_goods_query(by_category: bool, by_condition: bool, by_search: bool):
+    query = select(*_GOODS_COLS)
+
+    if by_category:
+        query = query.where(GoodsORM.category == bindparam("category"))
+    if by_condition:
+        query = query.where(GoodsORM.condition == bindparam("condition"))
+    if by_search:
         query = query.where(
-            or_(
-                GoodsORM.title.ilike(search_pattern),
-                GoodsORM.description.ilike(search_pattern),
+            GoodsORM.id.in_(
+                select(goods_fts.c.rowid).where(
+                    literal_column("goods_fts").match(bindparam("search"))
+                )
             )
         )
+    return query.limit(bindparam("limit"))
 
-    query = query.limit(limit)
-    result = await db.execute(query)
 
-    result = result.scalars().all()
-    return result
+def _fts_query(search: str):
+    # Каждое слово ищется по префиксу; кавычки внутри слова экранируются
+    tokens = ['"{}"*'.format(token.replace('"', '""')) for token in search.split()]
+    return " ".join(tokens) or None
+
+
+# Все 8 вариантов фильтрации каталога, ключ: (category, condition, search).
+# Запросы полностью параметризованы (включая LIMIT) и не пересобираются на каждый вызов
+_GOODS_QUERIES = {
+    shape: _build_goods_query(*shape) for shape in product((False, True), repeat=3)
+}
+
+
+async def _select_goods(category, condition, search, limit, db: AsyncSession):
+    search = _fts_query(search) if search else None
+    query = _GOODS_QUERIES[(bool(category), bool(condition), bool(search))]
+    params = {
+        "category": category,
+        "condition": condition,
+        "search": search,
+        "limit": limit,
+    }
+    result = await db.execute(query, params)
+    return result.all()
 
 
 async def get_your_goods(user_id: int, db: AsyncSession):
-    query = await db.execute(select(GoodsORM).filter(GoodsORM.user_id == user_id))
-    goods = query.scalars().all()
-    return goods
+    query = await db.execute(select(*_GOODS_COLS).filter(GoodsORM.user_id == user_id))
+    return GoodsOutList.validate_python(query.all(), from_attributes=True)
 
 
 async def get_good_by_id(good_id, db: AsyncSession):
-        query = await db.execute(select(GoodsORM).filter(GoodsORM.id == good_id))
-        good = query.scalar()
-        return good
+    if redis_client is not None:
+        cached = await _cache_get(f"good:{good_id}")
+        if cached is not None:
+            return GoodsOut.model_validate_json(cached)
 
+    query = await db.execute(select(GoodsORM).filter(GoodsORM.id == good_id))
+    good = query.scalar()
+
+    if redis_client is not None and good is not None:
+        good = GoodsOut.model_validate(good)
+        await _cache_set(f"good:{good_id}", good.model_dump_json(), GOOD_CACHE_TTL)
+    return good
 
-async def update_goods(good_id: int, update_data: GoodsUpdate, user_id: int, db: AsyncSession):
-    query = await db.get(GoodsORM, good_id)
 
-    if not query:
+async def _raise_good_not_owned(good_id: int, db: AsyncSession):
+    # Вызывается, только если UPDATE/DELETE не затронул ни одной строки
+    if await db.scalar(select(GoodsORM.id).where(GoodsORM.id == good_id)) is None:
         raise HTTPException(status_code=404, detail="Объявление не найдено")
+    raise HTTPException(status_code=403, detail="Доступ запрещен")
+
 
-    if query.user_id != user_id:
-        raise HTTPException(status_code=403, detail="Доступ запрещен")
+async def update_goods(good_id: int, update_data: GoodsUpdate, user_id: int, db: AsyncSession):
+    values = update_data.model_dump(exclude_unset=True)
+    if values:
+        query = update(GoodsORM).values(**values).returning(*_GOODS_COLS)
+    else:
+        query = select(*_GOODS_COLS)
+    query = query.where(GoodsORM.id == good_id, GoodsORM.user_id == user_id)
 
-    for field, value in update_data.model_dump(exclude_unset=True).items():
-        setattr(query, field, value)
+    good = (await db.execute(query)).one_or_none()
+    if good is None:
+        await _raise_good_not_owned(good_id, db)
 
-    await db.flush()
-    await db.refresh(query)
-    good_out = GoodsOut.model_validate(query)
     await db.commit()
-    return good_out
+    await _invalidate_goods_cache(good_id)
+    return GoodsOut.model_validate(good)
 
 
 async def delete_good_by_id(good_id: int, user_id: int, db: AsyncSession):
-    query = await db.get(GoodsORM, good_id)
-
-    if not query:
-        raise HTTPException(status_code=404, detail="Объявление не найдено")
-
-    if query.user_id != user_id:
-        raise HTTPException(status_code=403, detail="Доступ запрещен")
+    query = (
+        delete(GoodsORM)
+        .where(GoodsORM.id == good_id, GoodsORM.user_id == user_id)
+        .returning(GoodsORM.id)
+    )
+    if await db.scalar(query) is None:
+        await _raise_good_not_owned(good_id, db)
 
-    await db.delete(query)
     await db.commit()
+    await _invalidate_goods_cache(good_id)
     return {"message": "Объявление успешно удалено"}
 
 
 async def create_trade(trade_data: TradeCreate, sender_id: int, db: AsyncSession):
-    receiver_ad = await db.get(GoodsORM, trade_data.ad_receiver_id)
-    if not receiver_ad:
+    receiver_id = await db.scalar(
+        select(GoodsORM.user_id).where(GoodsORM.id == trade_data.ad_receiver_id)
+    )
+    if receiver_id is None:
         raise HTTPException(
             status_code=404, detail="Объявление получателя не найдено"
         )
-    if sender_id == receiver_ad.user_id:
+    if sender_id == receiver_id:
         raise HTTPException(
             status_code=400, detail="Нельзя предложить обмен самому себе"
         )
 
-    new_trade = TradeORM(
+    query = (
+        insert(TradeORM)
+        .values(
+            ad_sender_id=trade_data.ad_sender_id,
+            ad_receiver_id=trade_data.ad_receiver_id,
+            comment=trade_data.comment,
+            sender_id=sender_id,
+            receiver_id=receiver_id,
+        )
+        .returning(TradeORM.id, TradeORM.status)
+    )
+    new_trade = (await db.execute(query)).one()
+    await db.commit()
+    return TradeOut(
+        id=new_trade.id,
         ad_sender_id=trade_data.ad_sender_id,
         ad_receiver_id=trade_data.ad_receiver_id,
         comment=trade_data.comment,
-        sender_id=sender_id,
-        receiver_id=receiver_ad.user_id,
+        status=new_trade.status,
     )
-    db.add(new_trade)
-    await db.flush()
-    await db.refresh(new_trade)
-    trade = TradeOut.model_validate(new_trade)
-    await db.commit()
-    return trade
 
 
 async def get_trades(sender_id, receiver_id, status, db: AsyncSession = None):
 
-    query = select(TradeORM)
+    query = select(
+        TradeORM.id,
+        TradeORM.ad_sender_id,
+        TradeORM.ad_receiver_id,
+        TradeORM.comment,
+        TradeORM.status,
+    )
 
     if sender_id is not None and receiver_id is not None:
         # Получаем сделки, где sender_id = X или receiver_id = X (текущий пользователь)
@@ -159,8 +319,11 @@ async def get_trades(sender_id, receiver_id, status, db: AsyncSession = None):
     if status is not None:
         query = query.where(TradeORM.status == status)
 
-    result = await db.execute(query)
-    return result.scalars().all()
+    result = await db.stream(query.execution_options(yield_per=200))
+    trades = []
+    async for partition in result.partitions():
+        trades.extend(TradeOutList.validate_python(partition, from_attributes=True))
+    return trades
 
 
 async def update_trade_status(trade_id: int, status: TradeStatus, user_id: int, db: AsyncSession):
@@ -1,9 +1,43 @@
+import os
+
+from redis.asyncio import Redis
+from sqlalchemy import event
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 
-engine = create_async_engine(url="sqlite+aiosqlite:///db.sqlite3")
+# Небольшой постоянный пул: соединения не закрываются при возврате,
+# поэтому PRAGMA, кэш страниц и кэш подготовленных запросов SQLite остаются тёплыми
+engine = create_async_engine(
+    url="sqlite+aiosqlite:///db.sqlite3",
+    connect_args={"check_same_thread": False},
+    pool_size=5,
+    max_overflow=0,
+    query_cache_size=2048,
+)
+
+SQLITE_PRAGMAS = (
+    "journal_mode=WAL",
+    "synchronous=NORMAL",
+    "cache_size=-65536",
+    "mmap_size=268435456",
+    "temp_store=MEMORY",
+)
+
+
+@event.listens_for(engine.sync_engine, "connect")
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for pragma in SQLITE_PRAGMAS:
+        cursor.execute(f"PRAGMA {pragma}")
+    cursor.close()
+
 
 async_session = async_sessionmaker(engine)
 
+# Кэш каталога товаров; без REDIS_URL кэширование отключено
+REDIS_URL = os.getenv("REDIS_URL")
+
+redis_client = Redis.from_url(REDIS_URL) if REDIS_URL else None
+
 
 async def get_db():
     async with async_session() as session:
@@ -1,24 +1,30 @@
+import os
 from contextlib import asynccontextmanager
 from datetime import timedelta
 from typing import Annotated
 
 import uvicorn
-from fastapi import Depends, FastAPI, status
+from fastapi import Depends, FastAPI, Response, status
+from fastapi.middleware.gzip import GZipMiddleware
 from fastapi.params import Query
+from fastapi.responses import ORJSONResponse
 from fastapi.security import OAuth2PasswordRequestForm
 
 from src.database.models import ConditionsGoods, Base
 from src.database.requests import *
-from src.database.session import get_db, engine
+from src.database.session import get_db, engine, redis_client
 from src.models import (
     Token,
     UserCreate,
     Goods,
     GoodsOut,
+    GoodsOutList,
     GoodsUpdate,
     TradeOut,
+    TradeOutList,
     TradeCreate,
     TradeUpdate,
+    UserAuth,
 )
 from src.security import (
     ACCESS_TOKEN_EXPIRE_MINUTES,
@@ -31,22 +37,26 @@ from src.security import (
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+    # Схема создаётся только по запросу: python -m src.database.models или SCHEMA_INIT=1
+    if os.getenv("SCHEMA_INIT") == "1":
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
     yield
+    if redis_client is not None:
+        await redis_client.aclose()
 
 
-app = FastAPI(lifespan=lifespan, title="Площадка для обмена товарами")
+app = FastAPI(
+    lifespan=lifespan,
+    title="Площадка для обмена товарами",
+    default_response_class=ORJSONResponse,
+)
+app.add_middleware(GZipMiddleware, minimum_size=512)
 
 
 @app.post("/register", tags=["users"])
 async def registration_user(user: UserCreate, db: AsyncSession = Depends(get_db)):
-    if await is_username_taken(username=user.username, db=db):
-        raise HTTPException(
-            status_code=400, detail="Пользователь с таким именем уже существует"
-        )
-
-    hashed_password = get_password_hash(user.password)
+    hashed_password = await get_password_hash(user.password)
     await user_registration(user.username, hashed_password, db)
     return {"message": "Пользователь зарегистрирован"}
 
@@ -74,19 +84,19 @@ async def login_for_access_token(
     return Token(access_token=access_token, token_type="bearer")
 
 
-@app.get("/goods/mine", tags=["goods"])
+@app.get("/goods/mine", response_model=list[GoodsOut], tags=["goods"])
 async def read_your_goods(
-    current_user: Annotated[UsersORM, Depends(get_current_user)],
+    current_user: Annotated[UserAuth, Depends(get_current_user)],
     db: AsyncSession = Depends(get_db),
 ):
     response = await get_your_goods(current_user.id, db)
-    return response
+    return Response(GoodsOutList.dump_json(response), media_type="application/json")
 
 
 @app.post("/goods/", tags=["goods"])
 async def create_goods(
     good: Goods,
-    current_user: Annotated[UsersORM, Depends(get_current_user)],
+    current_user: Annotated[UserAuth, Depends(get_current_user)],
     db: AsyncSession = Depends(get_db),
 ):
     response = await add_goods(good, user_id=current_user.id, db=db)
@@ -102,7 +112,7 @@ async def get_goods(
     db: AsyncSession = Depends(get_db),
 ):
     response = await get_goods_from_db(category, condition, search, limit, db)
-    return response
+    return Response(GoodsOutList.dump_json(response), media_type="application/json")
 
 
 @app.get("/goods/{good_id}", response_model=GoodsOut, tags=["goods"])
@@ -115,7 +125,7 @@ async def get_one_good(good_id: int, db: AsyncSession = Depends(get_db)):
 async def edit_good(
     good_id: int,
     update_data: GoodsUpdate,
-    current_user: Annotated[UsersORM, Depends(get_current_user)],
+    current_user: Annotated[UserAuth, Depends(get_current_user)],
     db: AsyncSession = Depends(get_db),
 ):
     updated = await update_goods(good_id, update_data, user_id=current_user.id, db=db)
@@ -125,7 +135,7 @@ async def edit_good(
 @app.delete("/goods/{good_id}", tags=["goods"])
 async def delete_good(
     good_id: int,
-    current_user: Annotated[UsersORM, Depends(get_current_user)],
+    current_user: Annotated[UserAuth, Depends(get_current_user)],
     db: AsyncSession = Depends(get_db),
 ):
     response = await delete_good_by_id(good_id, current_user.id, db=db)
@@ -135,7 +145,7 @@ async def delete_good(
 @app.post("/offers/", response_model=TradeOut, tags=["offers"])
 async def send_trade_offer(
     trade_data: TradeCreate,
-    current_user: Annotated[UsersORM, Depends(get_current_user)],
+    current_user: Annotated[UserAuth, Depends(get_current_user)],
     db: AsyncSession = Depends(get_db),
 ):
     trade = await create_trade(trade_data, sender_id=current_user.id, db=db)
@@ -155,14 +165,14 @@ async def get_list_trades(
         receiver_id = current_user.id
 
     trades = await get_trades(sender_id, receiver_id, trade_status, db=db)
-    return trades
+    return Response(TradeOutList.dump_json(trades), media_type="application/json")
 
 
 @app.patch("/offers/{offer_id}", response_model=TradeOut, tags=["offers"])
 async def change_trade_status(
     offer_id: int,
     update: TradeUpdate,
-    current_user: Annotated[UsersORM, Depends(get_current_user)],
+    current_user: Annotated[UserAuth, Depends(get_current_user)],
     db: AsyncSession = Depends(get_db),
 ):
     trade = await update_trade_status(offer_id, update.status, current_user.id, db=db)
@@ -170,4 +180,8 @@ async def change_trade_status(
 
 
 if __name__ == "__main__":
-    uvicorn.run("main:app", host="127.0.0.1", port=8000, reload=True)
+    workers = int(os.getenv("UVICORN_WORKERS", "1"))
+    # reload работает только с одним процессом
+    uvicorn.run(
+        "main:app", host="127.0.0.1", port=8000, reload=workers == 1, workers=workers
+    )
@@ -1,6 +1,7 @@
+from dataclasses import dataclass
 from datetime import datetime
 
-from pydantic import BaseModel, ConfigDict
+from pydantic import BaseModel, ConfigDict, TypeAdapter
 
 from src.database.models import ConditionsGoods, TradeStatus
 
@@ -14,6 +15,13 @@ class TokenData(BaseModel):
     username: str | None = None
 
 
+@dataclass(frozen=True, slots=True)
+class UserAuth:
+    id: int
+    username: str
+    hashed_password: str
+
+
 class UserCreate(BaseModel):
     username: str
     password: str
@@ -66,3 +74,8 @@ class TradeOut(BaseModel):
     ad_receiver_id: int
     comment: str
     status: TradeStatus
+
+
+GoodsOutList = TypeAdapter(list[GoodsOut])
+
+TradeOutList = TypeAdapter(list[TradeOut])
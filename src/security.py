@@ -1,3 +1,6 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
 from datetime import timedelta, datetime, timezone
 from typing import Annotated
 
@@ -8,7 +11,7 @@ from passlib.context import CryptContext
 from jwt.exceptions import InvalidTokenError
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from src.database.requests import get_user_by_username
+from src.database.requests import get_user_by_username, update_password_hash
 from src.database.session import get_db
 
 from src.models import TokenData
@@ -19,25 +22,55 @@ ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 5
 
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# bcrypt оставлен для проверки уже сохранённых хэшей,
+# при успешном входе они пересчитываются в argon2
+pwd_context = CryptContext(
+    schemes=["argon2", "bcrypt"],
+    deprecated="auto",
+    argon2__time_cost=2,
+    argon2__memory_cost=19456,
+    argon2__parallelism=1,
+)
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/login")
 
+# argon2/bcrypt отпускают GIL, поэтому хэши считаются параллельно по числу ядер
+crypto_executor = ThreadPoolExecutor(
+    max_workers=os.cpu_count(), thread_name_prefix="crypto"
+)
 
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+
+async def verify_password(plain_password, hashed_password):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        crypto_executor, pwd_context.verify, plain_password, hashed_password
+    )
+
+
+async def verify_and_update_password(plain_password, hashed_password):
+    # Возвращает (совпал ли пароль, новый хэш или None, если пересчёт не нужен)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        crypto_executor, pwd_context.verify_and_update, plain_password, hashed_password
+    )
 
 
-def get_password_hash(password):
-    return pwd_context.hash(password)
+async def get_password_hash(password):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(crypto_executor, pwd_context.hash, password)
 
 
 async def authenticate_user(username: str, password: str, db: AsyncSession):
     user = await get_user_by_username(username, db)
     if not user:
         return False
-    if not verify_password(password, user.hashed_password):
+    verified, new_hash = await verify_and_update_password(
+        password, user.hashed_password
+    )
+    if not verified:
         return False
+    if new_hash is not None:
+        await update_password_hash(user, new_hash, db)
     return user
 
 
@@ -1,45 +1,210 @@
 import asyncio
 
+import orjson
 import pytest
-from fastapi import status
-from fastapi.testclient import TestClient
+from fastapi import HTTPException, status
 from httpx import AsyncClient, ASGITransport
+from passlib.context import CryptContext
+from passlib.hash import bcrypt
+from redis.exceptions import ConnectionError as RedisConnectionError
+from sqlalchemy import insert, select, update
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.pool import StaticPool
 
 from src.database.models import Base, UsersORM, GoodsORM
+from src.database import requests as db_requests
+from src.database.requests import get_user_by_username
 from src.database.session import get_db
-from src.main import app
-from src.security import get_password_hash
+from src import security
+from src.main import app, delete_good, edit_good, get_one_good
+from src.models import GoodsUpdate
+from src.security import create_access_token, get_password_hash
 
+# Под pytest-xdist каждый воркер — отдельный процесс со своей in-memory БД
 DATABASE_URL = "sqlite+aiosqlite:///:memory:"
-engine = create_async_engine(DATABASE_URL)
+# StaticPool: все сессии работают через одно соединение и видят одну in-memory БД
+engine = create_async_engine(
+    DATABASE_URL,
+    connect_args={"check_same_thread": False},
+    poolclass=StaticPool,
+)
 
 async_session_for_test = async_sessionmaker(engine, expire_on_commit=False)
 
 
-@pytest.fixture(scope="session")
-def event_loop():
-    # Создаем event loop для сессии тестов (нужно для pytest-asyncio)
-    loop = asyncio.get_event_loop_policy().new_event_loop()
-    yield loop
-    loop.close()
+@pytest.fixture(scope="session", autouse=True)
+def fast_password_hashing():
+    # Минимальные параметры argon2: стойкость хэшей в тестах не нужна
+    test_context = CryptContext(
+        schemes=["argon2", "bcrypt"],
+        deprecated="auto",
+        argon2__time_cost=1,
+        argon2__memory_cost=8,
+        argon2__parallelism=1,
+        bcrypt__rounds=4,
+    )
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(security, "pwd_context", test_context)
+        yield
+
+
+@pytest.fixture(scope="session", autouse=True)
+def disable_redis_cache():
+    # Кэш из REDIS_URL разработчика не должен отдавать ключи прошлых прогонов
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(db_requests, "redis_client", None)
+        yield
+
+
+class FakeRedis:
+    # Минимум redis.asyncio.Redis, который использует кэш каталога
+    def __init__(self):
+        self.store = {}
+
+    async def get(self, key):
+        return self.store.get(key)
+
+    async def set(self, key, value, ex=None):
+        self.store[key] = value.encode() if isinstance(value, str) else value
+
+    async def delete(self, *keys):
+        for key in keys:
+            self.store.pop(key, None)
+
+    async def scan_iter(self, match):
+        prefix = match.rstrip("*")
+        for key in list(self.store):
+            if key.startswith(prefix):
+                yield key
+
+
+class BrokenRedis(FakeRedis):
+    # Redis недоступен: каждая операция падает с ошибкой соединения
+    async def get(self, key):
+        raise RedisConnectionError("Redis is down")
+
+    async def set(self, key, value, ex=None):
+        raise RedisConnectionError("Redis is down")
+
+    async def delete(self, *keys):
+        raise RedisConnectionError("Redis is down")
+
+    async def scan_iter(self, match):
+        raise RedisConnectionError("Redis is down")
+        yield
 
 
 @pytest.fixture(scope="session", autouse=True)
 async def prepare_database():
-    # Создаем таблицы перед тестами
+    # Создаем таблицы один раз; in-memory БД исчезает вместе с процессом
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
-    yield
-    # После всех тестов таблицы удалить (если нужно)
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.drop_all)
 
 
-async_client = TestClient(app)
+TRANSPORT = ASGITransport(app=app)
+
+# OAuth2PasswordRequestForm требует form-data, не json
+FORM_HEADERS = {"Content-Type": "application/x-www-form-urlencoded"}
+
 
+class ORJSONAsyncClient(AsyncClient):
+    # json= в запросах кодируется через orjson вместо stdlib json
+    def build_request(self, method, url, *, json=None, **kwargs):
+        if json is not None:
+            kwargs["content"] = orjson.dumps(json)
+            kwargs["headers"] = {
+                **(kwargs.get("headers") or {}),
+                "Content-Type": "application/json",
+            }
+        return super().build_request(method, url, **kwargs)
 
-@pytest.fixture()
+
+@pytest.fixture(scope="session")
+async def client():
+    # Один HTTP-клиент на все тесты
+    async with ORJSONAsyncClient(transport=TRANSPORT, base_url="http://test") as client:
+        yield client
+
+
+@pytest.fixture(scope="session")
+async def auth(client):
+    # Регистрирует и логинит пользователя один раз за сессию
+    headers_by_username = {}
+
+    async def get_auth_headers(username, password="pass"):
+        if username not in headers_by_username:
+            await client.post(
+                "/register", json={"username": username, "password": password}
+            )
+            response = await client.post(
+                "/login",
+                data={"username": username, "password": password},
+                headers=FORM_HEADERS,
+            )
+            assert response.status_code == 200
+            token = response.json()["access_token"]
+            headers_by_username[username] = {"Authorization": f"Bearer {token}"}
+        return headers_by_username[username]
+
+    return get_auth_headers
+
+
+OWNED_GOOD = {
+    "title": "Original Title",
+    "description": "Original description",
+    "image_url": "http://example.com/original.jpg",
+    "category": "original_category",
+    "condition": "б/у",
+}
+
+
+@pytest.fixture(scope="module")
+async def owned_good(client, auth):
+    # Один товар на модуль: тесты читают, меняют и удаляют его именно в этом порядке
+    auth_headers = await auth("owner", "testpass")
+    response = await client.post("/goods/", json=OWNED_GOOD, headers=auth_headers)
+    assert response.status_code == 200
+    async with async_session_for_test() as db:
+        owner = await get_user_by_username("owner", db)
+    return response.json()["goods"]["id"], owner
+
+
+SENDER_GOOD = {
+    "title": "Sender Item",
+    "description": "Sender's good",
+    "image_url": "http://example.com/item2.jpg",
+    "category": "game",
+    "condition": "б/у",
+}
+
+RECEIVER_GOOD = {
+    "title": "Receiver Item",
+    "description": "Receiver's good",
+    "image_url": "http://example.com/item1.jpg",
+    "category": "book",
+    "condition": "новый",
+}
+
+
+@pytest.fixture(scope="module")
+async def trade_pair(client, auth):
+    # Отправитель и получатель с объявлением у каждого, общие для тестов обмена
+    # Пользователи и их объявления независимы — создаем параллельно
+    sender_headers, receiver_headers = await asyncio.gather(
+        auth("sender_user", "senderpass"),
+        auth("receiver_user", "receiverpass"),
+    )
+
+    sender_resp, receiver_resp = await asyncio.gather(
+        client.post("/goods/", json=SENDER_GOOD, headers=sender_headers),
+        client.post("/goods/", json=RECEIVER_GOOD, headers=receiver_headers),
+    )
+    ad_sender_id = sender_resp.json()["goods"]["id"]
+    ad_receiver_id = receiver_resp.json()["goods"]["id"]
+    return sender_headers, receiver_headers, ad_sender_id, ad_receiver_id
+
+
+@pytest.fixture(scope="session")
 def override_get_db_fixture():
     async def override():
         async with async_session_for_test() as session:
@@ -48,490 +213,412 @@ def override_get_db_fixture():
     return override
 
 
-@pytest.fixture(autouse=True)
+# Сессионная область: подмена нужна и фикстурам уровня модуля
+@pytest.fixture(scope="session", autouse=True)
 def set_db_override(override_get_db_fixture):
+    # Подмена ставится один раз и живет до конца процесса
     app.dependency_overrides[get_db] = override_get_db_fixture
-    yield
-    app.dependency_overrides.clear()
-
-
-@pytest.mark.asyncio
-async def test_get_goods():
-    transport = ASGITransport(app=app)
-    async with AsyncClient(transport=transport, base_url="http://test") as client:
-        response = await client.get("/goods/")
-        assert response.status_code == 200
-        assert isinstance(response.json(), list)
-
-
-@pytest.mark.asyncio
-async def test_register_and_login():
-    transport = ASGITransport(app=app)
-    async with AsyncClient(transport=transport, base_url="http://test") as client:
-        # Регистрация нового пользователя
-        user_data = {"username": "testuser", "password": "testpassword"}
-        response = await client.post("/register", json=user_data)
-        assert response.status_code == status.HTTP_200_OK
-        assert response.json() == {"message": "Пользователь зарегистрирован"}
-
-        # Попытка повторной регистрации с тем же username - ошибка 400
-        response = await client.post("/register", json=user_data)
-        assert response.status_code == status.HTTP_400_BAD_REQUEST
-        assert "уже существует" in response.json()["detail"]
-
-        # Успешный вход
-        login_data = {"username": "testuser", "password": "testpassword"}
-        response = await client.post(
-            "/login",
-            data=login_data,  # OAuth2PasswordRequestForm требует form-data, не json
-            headers={"Content-Type": "application/x-www-form-urlencoded"},
-        )
-        assert response.status_code == status.HTTP_200_OK
-        json_resp = response.json()
-        assert "access_token" in json_resp
-        assert json_resp["token_type"] == "bearer"
-
-        # Ошибка входа — неправильный пароль
-        bad_login_data = {"username": "testuser", "password": "wrongpassword"}
-        response = await client.post(
-            "/login",
-            data=bad_login_data,
-            headers={"Content-Type": "application/x-www-form-urlencoded"},
-        )
-        assert response.status_code == status.HTTP_401_UNAUTHORIZED
-        assert "Incorrect username or password" in response.json()["detail"]
 
 
-@pytest.mark.asyncio
-async def test_read_your_goods(override_get_db_fixture):
-    async for db in override_get_db_fixture():
-        # Создаём тестового пользователя
-        hashed_password = get_password_hash("testpass")
-        user = UsersORM(username="owner", hashed_password=hashed_password)
-        db.add(user)
-        await db.commit()
-        await db.refresh(user)
-
-        # Добавляем пару товаров от этого пользователя
-        good1 = GoodsORM(
-            title="Товар 1",
-            description="описание 1",
-            category="транспорт",
-            user_id=user.id,
-        )
-        good2 = GoodsORM(
-            title="Товар 2",
-            description="описание 2",
-            category="игрушка",
-            user_id=user.id,
-        )
-        db.add_all([good1, good2])
+@pytest.fixture(scope="session", autouse=True)
+async def warmup(client, prepare_database, set_db_override):
+    # Первый запрос собирает middleware-стек и соединение с БД — вне таймингов тестов
+    await client.get("/goods/")
+    await client.post("/register", json={"username": "_warm", "password": "x"})
+
+
+async def test_get_goods(client):
+    response = await client.get("/goods/")
+    assert response.status_code == 200
+    assert isinstance(response.json(), list)
+
+
+async def test_register_and_login(client):
+    # Регистрация нового пользователя
+    user_data = {"username": "testuser", "password": "testpassword"}
+    response = await client.post("/register", json=user_data)
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json() == {"message": "Пользователь зарегистрирован"}
+
+    # Попытка повторной регистрации с тем же username - ошибка 400
+    response = await client.post("/register", json=user_data)
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert "уже существует" in response.json()["detail"]
+
+    # Успешный вход
+    login_data = {"username": "testuser", "password": "testpassword"}
+    response = await client.post(
+        "/login",
+        data=login_data,  # OAuth2PasswordRequestForm требует form-data, не json
+        headers=FORM_HEADERS,
+    )
+    assert response.status_code == status.HTTP_200_OK
+    json_resp = response.json()
+    assert "access_token" in json_resp
+    assert json_resp["token_type"] == "bearer"
+
+    # Ошибка входа — неправильный пароль
+    bad_login_data = {"username": "testuser", "password": "wrongpassword"}
+    response = await client.post(
+        "/login",
+        data=bad_login_data,
+        headers=FORM_HEADERS,
+    )
+    assert response.status_code == status.HTTP_401_UNAUTHORIZED
+    assert "Incorrect username or password" in response.json()["detail"]
+
+
+async def test_login_upgrades_bcrypt_hash(client):
+    # Пользователь со старым bcrypt-хэшем
+    bcrypt_hash = bcrypt.using(rounds=4).hash("legacypass")
+    async with async_session_for_test() as db:
+        db.add(UsersORM(username="legacy_user", hashed_password=bcrypt_hash))
         await db.commit()
 
-    transport = ASGITransport(app=app)
-    async with AsyncClient(transport=transport, base_url="http://test") as client:
-        # Логин
-        response = await client.post(
-            "/login",
-            data={"username": "owner", "password": "testpass"},
-            headers={"Content-Type": "application/x-www-form-urlencoded"},
-        )
-        assert response.status_code == 200
-        token = response.json()["access_token"]
-
-        # Запрос своих товаров
-        response = await client.get(
-            "/goods/mine", headers={"Authorization": f"Bearer {token}"}
-        )
-        assert response.status_code == 200
-        data = response.json()
-        assert isinstance(data, list)
-        assert len(data) == 2
-        assert data[0]["title"] == "Товар 1"
-        assert data[1]["title"] == "Товар 2"
-
-
-@pytest.mark.asyncio
-async def test_create_goods():
-    transport = ASGITransport(app=app)
-    async with AsyncClient(transport=transport, base_url="http://test") as client:
-        # Регистрация
-        await client.post(
-            "/register", json={"username": "owner", "password": "testpass"}
-        )
-
-        # Логин
-        response = await client.post(
-            "/login",
-            data={"username": "owner", "password": "testpass"},
-            headers={"Content-Type": "application/x-www-form-urlencoded"},
-        )
-        assert response.status_code == 200
-        token = response.json()["access_token"]
-        auth_headers = {"Authorization": f"Bearer {token}"}
-
-        good_data = {
-            "title": "string",
-            "description": "string",
-            "image_url": "string",
-            "category": "string",
-            "condition": "новый",
-        }
-        # Запрос своих товаров с токеном в заголовке
-        response = await client.post("/goods/", json=good_data, headers=auth_headers)
-        assert response.status_code == 200
-        data = response.json()
-        assert data["message"] == "товар добавлен"
-        assert data["goods"]["title"] == good_data["title"]
-        assert data["goods"]["category"] == good_data["category"]
-
-
-@pytest.mark.asyncio
-async def test_get_one_good():
-    transport = ASGITransport(app=app)
-    async with AsyncClient(transport=transport, base_url="http://test") as client:
-        # Регистрация
-        await client.post(
-            "/register", json={"username": "owner", "password": "testpass"}
-        )
-
-        # Логин
-        response = await client.post(
-            "/login",
-            data={"username": "owner", "password": "testpass"},
-            headers={"Content-Type": "application/x-www-form-urlencoded"},
-        )
-        assert response.status_code == 200
-        token = response.json()["access_token"]
-        auth_headers = {"Authorization": f"Bearer {token}"}
-
-        # Добавляем товар
-        good_data = {
-            "title": "Test Good",
-            "description": "Get test description",
-            "image_url": "http://example.com/image.jpg",
-            "category": "get_test_category",
-            "condition": "новый",
-        }
-        create_resp = await client.post("/goods/", json=good_data, headers=auth_headers)
-        assert create_resp.status_code == 200
-        good_id = create_resp.json()["goods"]["id"]
-
-        # Получаем этот товар по ID
-        get_resp = await client.get(f"/goods/{good_id}")
-        assert get_resp.status_code == 200
-        good = get_resp.json()
-        assert good["title"] == good_data["title"]
-        assert good["description"] == good_data["description"]
-
-
-@pytest.mark.asyncio
-async def test_edit_good():
-    transport = ASGITransport(app=app)
-    async with AsyncClient(transport=transport, base_url="http://test") as client:
-        # Регистрация
-        await client.post(
-            "/register", json={"username": "owner", "password": "testpass"}
-        )
-
-        # Логин
-        response = await client.post(
-            "/login",
-            data={"username": "owner", "password": "testpass"},
-            headers={"Content-Type": "application/x-www-form-urlencoded"},
-        )
-        assert response.status_code == 200
-        token = response.json()["access_token"]
-        auth_headers = {"Authorization": f"Bearer {token}"}
-
-        # Создание товара
-        good_data = {
-            "title": "Original Title",
-            "description": "Original description",
-            "image_url": "http://example.com/original.jpg",
-            "category": "original_category",
-            "condition": "б/у",
-        }
-        create_resp = await client.post("/goods/", json=good_data, headers=auth_headers)
-        assert create_resp.status_code == 200
-        good_id = create_resp.json()["goods"]["id"]
-
-        # Обновление товара
-        update_data = {"title": "Updated Title", "description": "Updated description"}
-        patch_resp = await client.patch(
-            f"/goods/{good_id}", json=update_data, headers=auth_headers
-        )
-        assert patch_resp.status_code == 200
-
-        updated_good = patch_resp.json()
-        assert updated_good["title"] == update_data["title"]
-        assert updated_good["description"] == update_data["description"]
-        assert updated_good["category"] == good_data["category"]  # не изменяли
+    login_data = {"username": "legacy_user", "password": "legacypass"}
+    response = await client.post("/login", data=login_data, headers=FORM_HEADERS)
+    assert response.status_code == status.HTTP_200_OK
 
-
-@pytest.mark.asyncio
-async def test_delete_good():
-    transport = ASGITransport(app=app)
-    async with AsyncClient(transport=transport, base_url="http://test") as client:
-        # Регистрация
-        await client.post(
-            "/register", json={"username": "owner", "password": "testpass"}
-        )
-
-        # Логин
-        response = await client.post(
-            "/login",
-            data={"username": "owner", "password": "testpass"},
-            headers={"Content-Type": "application/x-www-form-urlencoded"},
-        )
-        assert response.status_code == 200
-        token = response.json()["access_token"]
-        auth_headers = {"Authorization": f"Bearer {token}"}
-
-        # Создание товара
-        good_data = {
-            "title": "Original Title",
-            "description": "Original description",
-            "image_url": "http://example.com/original.jpg",
-            "category": "original_category",
-            "condition": "б/у",
-        }
-        create_resp = await client.post("/goods/", json=good_data, headers=auth_headers)
-        assert create_resp.status_code == 200
-        good_id = create_resp.json()["goods"]["id"]
-
-        # Удаление товара
-        delete_resp = await client.delete(f"/goods/{good_id}", headers=auth_headers)
-        assert delete_resp.status_code == 200
-        assert delete_resp.json()["message"] == "Объявление успешно удалено"
-
-        # Повторное удаление (товара уже нет)
-        delete_again = await client.delete(f"/goods/{good_id}", headers=auth_headers)
-        assert delete_again.status_code == 404
-        assert delete_again.json()["detail"] == "Объявление не найдено"
-
-
-@pytest.mark.asyncio
-async def test_create_trade_offer():
-    transport = ASGITransport(app=app)
-    async with AsyncClient(transport=transport, base_url="http://test") as client:
-        # Регистрация и логин отправителя
-        sender = {"username": "sender_user", "password": "senderpass"}
-        await client.post("/register", json=sender)
-        sender_login = await client.post(
-            "/login",
-            data=sender,
-            headers={"Content-Type": "application/x-www-form-urlencoded"},
+    # После входа хэш пересчитан в argon2, и вход по нему работает
+    async with async_session_for_test() as db:
+        hashed_password = await db.scalar(
+            select(UsersORM.hashed_password).where(UsersORM.username == "legacy_user")
         )
-        sender_token = sender_login.json()["access_token"]
-        sender_headers = {"Authorization": f"Bearer {sender_token}"}
-
-        # Регистрация и логин получателя
-        receiver = {"username": "receiver_user", "password": "receiverpass"}
-        await client.post("/register", json=receiver)
-        receiver_login = await client.post(
-            "/login",
-            data=receiver,
-            headers={"Content-Type": "application/x-www-form-urlencoded"},
-        )
-        receiver_token = receiver_login.json()["access_token"]
-        receiver_headers = {"Authorization": f"Bearer {receiver_token}"}
-
-        # Получатель создаёт объявление
-        receiver_good = {
-            "title": "Receiver Item",
-            "description": "Receiver's good",
-            "image_url": "http://example.com/item1.jpg",
-            "category": "book",
-            "condition": "новый",
-        }
-        create_receiver_good = await client.post(
-            "/goods/", json=receiver_good, headers=receiver_headers
-        )
-        ad_receiver_id = create_receiver_good.json()["goods"]["id"]
-
-        # Отправитель создаёт своё объявление
-        sender_good = {
-            "title": "Sender Item",
-            "description": "Sender's good",
-            "image_url": "http://example.com/item2.jpg",
-            "category": "game",
-            "condition": "б/у",
-        }
-        create_sender_good = await client.post(
-            "/goods/", json=sender_good, headers=sender_headers
-        )
-        ad_sender_id = create_sender_good.json()["goods"]["id"]
-
-        # Отправка предложения обмена
-        trade_data = {
-            "ad_sender_id": ad_sender_id,
-            "ad_receiver_id": ad_receiver_id,
-            "comment": "Хотел бы обменяться",
-        }
-        response = await client.post(
-            "/offers/", json=trade_data, headers=sender_headers
-        )
-        assert response.status_code == 200
-
-        trade = response.json()
-        assert trade["ad_sender_id"] == ad_sender_id
-        assert trade["ad_receiver_id"] == ad_receiver_id
-        assert trade["comment"] == "Хотел бы обменяться"
-        assert trade["status"] == "ожидает"
+    assert hashed_password.startswith("$argon2")
 
+    response = await client.post("/login", data=login_data, headers=FORM_HEADERS)
+    assert response.status_code == status.HTTP_200_OK
 
-@pytest.mark.asyncio
-async def test_trade_list():
-    transport = ASGITransport(app=app)
-    async with AsyncClient(transport=transport, base_url="http://test") as client:
-        sender = {"username": "sender2", "password": "pass"}
-        receiver = {"username": "receiver2", "password": "pass"}
 
-        await client.post("/register", json=sender)
-        await client.post("/register", json=receiver)
-
-        sender_login = await client.post(
-            "/login",
-            data=sender,
-            headers={"Content-Type": "application/x-www-form-urlencoded"},
-        )
-        receiver_login = await client.post(
-            "/login",
-            data=receiver,
-            headers={"Content-Type": "application/x-www-form-urlencoded"},
+async def test_read_your_goods(client):
+    async with async_session_for_test() as db:
+        # Создаём тестового пользователя
+        hashed_password = await get_password_hash("testpass")
+        user = UsersORM(username="owner", hashed_password=hashed_password)
+        db.add(user)
+        await db.flush()
+
+        # Добавляем пару товаров от этого пользователя одним INSERT
+        await db.execute(
+            insert(GoodsORM),
+            [
+                {
+                    "title": "Товар 1",
+                    "description": "описание 1",
+                    "category": "транспорт",
+                    "user_id": user.id,
+                },
+                {
+                    "title": "Товар 2",
+                    "description": "описание 2",
+                    "category": "игрушка",
+                    "user_id": user.id,
+                },
+            ],
         )
+        await db.commit()
 
-        sender_token = sender_login.json()["access_token"]
-        receiver_token = receiver_login.json()["access_token"]
-
-        sender_headers = {"Authorization": f"Bearer {sender_token}"}
-        receiver_headers = {"Authorization": f"Bearer {receiver_token}"}
-
-        # Создаём объявления
-        sender_good = {
-            "title": "Sender2 Good",
-            "description": "A good from sender2",
-            "image_url": "http://example.com/s2.jpg",
-            "category": "book",
-            "condition": "новый",
-        }
-        receiver_good = {
-            "title": "Receiver2 Good",
-            "description": "A good from receiver2",
-            "image_url": "http://example.com/r2.jpg",
-            "category": "game",
-            "condition": "новый",
-        }
-
-        r1 = await client.post("/goods/", json=sender_good, headers=sender_headers)
-        r2 = await client.post("/goods/", json=receiver_good, headers=receiver_headers)
-
-        ad_sender_id = r1.json()["goods"]["id"]
-        ad_receiver_id = r2.json()["goods"]["id"]
-
-        # Создаём предложение обмена
-        trade_payload = {
-            "ad_sender_id": ad_sender_id,
-            "ad_receiver_id": ad_receiver_id,
-            "comment": "Интересует обмен",
-        }
-        resp = await client.post("/offers/", json=trade_payload, headers=sender_headers)
-        assert resp.status_code == 200, resp.text
-
-        # Получение списка сделок отправителем
-        response = await client.get("/offers/", headers=sender_headers)
-        assert response.status_code == 200
-
-        trades = response.json()
-        assert isinstance(trades, list)
-        assert len(trades) >= 1
-        trade = trades[0]
-        assert trade["ad_sender_id"] == ad_sender_id
-        assert trade["ad_receiver_id"] == ad_receiver_id
-        assert trade["status"] == "ожидает"
-
-
-@pytest.mark.asyncio
-async def test_change_trade_status():
-    transport = ASGITransport(app=app)
-    async with AsyncClient(transport=transport, base_url="http://test") as client:
-        # Регистрируем двух пользователей
-        sender = {"username": "sender3", "password": "pass"}
-        receiver = {"username": "receiver3", "password": "pass"}
-
-        await client.post("/register", json=sender)
-        await client.post("/register", json=receiver)
-
-        # Логиним двух пользователей
-        sender_login = await client.post(
-            "/login",
-            data=sender,
-            headers={"Content-Type": "application/x-www-form-urlencoded"},
-        )
-        receiver_login = await client.post(
-            "/login",
-            data=receiver,
-            headers={"Content-Type": "application/x-www-form-urlencoded"},
-        )
-        sender_token = sender_login.json()["access_token"]
-        receiver_token = receiver_login.json()["access_token"]
-
-        sender_headers = {"Authorization": f"Bearer {sender_token}"}
-        receiver_headers = {"Authorization": f"Bearer {receiver_token}"}
-
-        # Создаём объявления для отправителя и получателя
-        sender_good = {
-            "title": "Sender3 Good",
-            "description": "Good from sender3",
-            "image_url": "http://example.com/s3.jpg",
-            "category": "book",
-            "condition": "новый",
-        }
-        receiver_good = {
-            "title": "Receiver3 Good",
-            "description": "Good from receiver3",
-            "image_url": "http://example.com/r3.jpg",
-            "category": "game",
-            "condition": "новый",
-        }
-
-        r1 = await client.post("/goods/", json=sender_good, headers=sender_headers)
-        r2 = await client.post("/goods/", json=receiver_good, headers=receiver_headers)
-
-        ad_sender_id = r1.json()["goods"]["id"]
-        ad_receiver_id = r2.json()["goods"]["id"]
-
-        # Создаём предложение обмена (trade)
-        trade_payload = {
-            "ad_sender_id": ad_sender_id,
-            "ad_receiver_id": ad_receiver_id,
-            "comment": "Хочу обменять",
-        }
-        trade_resp = await client.post(
-            "/offers/", json=trade_payload, headers=sender_headers
-        )
-        assert trade_resp.status_code == 200
-        trade = trade_resp.json()
-        offer_id = trade["id"]
+    # Токен выпускаем напрямую: вход через /login проверяется отдельно
+    token = create_access_token({"sub": user.username, "id": user.id})
 
-        # Получаем текущее состояние предложения (должно быть 'ожидает')
-        assert trade["status"] == "ожидает"
+    # Запрос своих товаров
+    response = await client.get(
+        "/goods/mine", headers={"Authorization": f"Bearer {token}"}
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert isinstance(data, list)
+    assert len(data) == 2
+    assert data[0]["title"] == "Товар 1"
+    assert data[1]["title"] == "Товар 2"
 
-        # Меняем статус предложения на 'принята' от имени получателя (receiver)
-        update_payload = {"status": "принята"}
 
-        patch_resp = await client.patch(
-            f"/offers/{offer_id}", json=update_payload, headers=receiver_headers
+async def test_search_goods(client):
+    async with async_session_for_test() as db:
+        user = UsersORM(username="searcher", hashed_password="-")
+        db.add(user)
+        await db.flush()
+
+        await db.execute(
+            insert(GoodsORM),
+            [
+                {
+                    "title": "Горный велосипед",
+                    "description": "Почти новый",
+                    "category": "search_category",
+                    "user_id": user.id,
+                },
+                {
+                    "title": "Настольная лампа",
+                    "description": "Подходит к велосипеду по цвету",
+                    "category": "search_category",
+                    "user_id": user.id,
+                },
+                {
+                    "title": "Шахматы",
+                    "description": "Деревянные",
+                    "category": "search_category",
+                    "user_id": user.id,
+                },
+            ],
         )
-        assert patch_resp.status_code == 200
-
-        updated_trade = patch_resp.json()
-        assert updated_trade["id"] == offer_id
-        assert updated_trade["status"] == "принята"
+        await db.commit()
 
-        # Проверяем, что нельзя изменить статус от имени не получателя (sender)
-        forbidden_resp = await client.patch(
-            f"/offers/{offer_id}", json={"status": "отклонена"}, headers=sender_headers
+    params = {"category": "search_category"}
+
+    # Поиск по началу слова в названии и в описании, без учёта регистра
+    response = await client.get("/goods/", params={**params, "search": "Велосип"})
+    assert response.status_code == 200
+    titles = {good["title"] for good in response.json()}
+    assert titles == {"Горный велосипед", "Настольная лампа"}
+
+    # Все слова запроса должны встречаться в товаре
+    response = await client.get("/goods/", params={**params, "search": "горный вел"})
+    assert [good["title"] for good in response.json()] == ["Горный велосипед"]
+
+    response = await client.get("/goods/", params={**params, "search": "самокат"})
+    assert response.json() == []
+
+
+async def test_create_goods(client, auth):
+    auth_headers = await auth("owner", "testpass")
+
+    good_data = {
+        "title": "string",
+        "description": "string",
+        "image_url": "string",
+        "category": "string",
+        "condition": "новый",
+    }
+    # Запрос своих товаров с токеном в заголовке
+    response = await client.post("/goods/", json=good_data, headers=auth_headers)
+    assert response.status_code == 200
+    data = response.json()
+    assert data["message"] == "товар добавлен"
+    assert data["goods"]["title"] == good_data["title"]
+    assert data["goods"]["category"] == good_data["category"]
+
+
+# CRUD по товару проверяется вызовом обработчиков напрямую, без HTTP-слоя
+async def test_get_one_good(owned_good):
+    good_id, _ = owned_good
+
+    # Получаем товар по ID
+    async with async_session_for_test() as db:
+        good = await get_one_good(good_id, db=db)
+    assert good.title == OWNED_GOOD["title"]
+    assert good.description == OWNED_GOOD["description"]
+
+
+async def test_edit_good(owned_good):
+    good_id, owner = owned_good
+
+    # Обновление товара
+    update_data = GoodsUpdate(title="Updated Title", description="Updated description")
+    async with async_session_for_test() as db:
+        updated_good = await edit_good(good_id, update_data, current_user=owner, db=db)
+
+    assert updated_good.title == update_data.title
+    assert updated_good.description == update_data.description
+    assert updated_good.category == OWNED_GOOD["category"]  # не изменяли
+
+
+async def test_delete_good(owned_good):
+    good_id, owner = owned_good
+
+    # Удаление товара
+    async with async_session_for_test() as db:
+        response = await delete_good(good_id, current_user=owner, db=db)
+    assert response["message"] == "Объявление успешно удалено"
+
+    # Повторное удаление (товара уже нет)
+    async with async_session_for_test() as db:
+        with pytest.raises(HTTPException) as exc_info:
+            await delete_good(good_id, current_user=owner, db=db)
+    assert exc_info.value.status_code == 404
+    assert exc_info.value.detail == "Объявление не найдено"
+
+
+async def test_good_access_checks(client, auth):
+    owner_headers, stranger_headers = await asyncio.gather(
+        auth("access_owner", "ownerpass"),
+        auth("access_stranger", "strangerpass"),
+    )
+    response = await client.post("/goods/", json=OWNED_GOOD, headers=owner_headers)
+    good = response.json()["goods"]
+    good_id = good["id"]
+
+    # Чужой товар нельзя ни изменить, ни удалить
+    response = await client.patch(
+        f"/goods/{good_id}", json={"title": "Hacked"}, headers=stranger_headers
+    )
+    assert response.status_code == 403
+    assert response.json()["detail"] == "Доступ запрещен"
+
+    response = await client.delete(f"/goods/{good_id}", headers=stranger_headers)
+    assert response.status_code == 403
+
+    # Несуществующий товар — 404, а не 403
+    response = await client.patch(
+        "/goods/999999", json={"title": "Ghost"}, headers=owner_headers
+    )
+    assert response.status_code == 404
+    assert response.json()["detail"] == "Объявление не найдено"
+
+    # Пустой PATCH владельца возвращает товар без изменений
+    response = await client.patch(f"/goods/{good_id}", json={}, headers=owner_headers)
+    assert response.status_code == 200
+    assert response.json() == good
+
+
+async def test_create_trade_offer(client, trade_pair):
+    sender_headers, _, ad_sender_id, ad_receiver_id = trade_pair
+
+    # Отправка предложения обмена
+    trade_data = {
+        "ad_sender_id": ad_sender_id,
+        "ad_receiver_id": ad_receiver_id,
+        "comment": "Хотел бы обменяться",
+    }
+    response = await client.post("/offers/", json=trade_data, headers=sender_headers)
+    assert response.status_code == 200
+
+    trade = response.json()
+    assert trade["ad_sender_id"] == ad_sender_id
+    assert trade["ad_receiver_id"] == ad_receiver_id
+    assert trade["comment"] == "Хотел бы обменяться"
+    assert trade["status"] == "ожидает"
+
+
+async def test_trade_list(client, trade_pair):
+    sender_headers, _, ad_sender_id, ad_receiver_id = trade_pair
+
+    # Создаём предложение обмена
+    trade_payload = {
+        "ad_sender_id": ad_sender_id,
+        "ad_receiver_id": ad_receiver_id,
+        "comment": "Интересует обмен",
+    }
+    resp = await client.post("/offers/", json=trade_payload, headers=sender_headers)
+    assert resp.status_code == 200, resp.text
+    offer_id = resp.json()["id"]
+
+    # Получение списка сделок отправителем
+    response = await client.get("/offers/", headers=sender_headers)
+    assert response.status_code == 200
+
+    trades = response.json()
+    assert isinstance(trades, list)
+    assert len(trades) >= 1
+    # У общей пары могут быть и предложения из соседних тестов
+    trade = next(trade for trade in trades if trade["id"] == offer_id)
+    assert trade["ad_sender_id"] == ad_sender_id
+    assert trade["ad_receiver_id"] == ad_receiver_id
+    assert trade["status"] == "ожидает"
+
+
+async def test_change_trade_status(client, trade_pair):
+    sender_headers, receiver_headers, ad_sender_id, ad_receiver_id = trade_pair
+
+    # Создаём предложение обмена (trade)
+    trade_payload = {
+        "ad_sender_id": ad_sender_id,
+        "ad_receiver_id": ad_receiver_id,
+        "comment": "Хочу обменять",
+    }
+    trade_resp = await client.post(
+        "/offers/", json=trade_payload, headers=sender_headers
+    )
+    assert trade_resp.status_code == 200
+    trade = trade_resp.json()
+    offer_id = trade["id"]
+
+    # Получаем текущее состояние предложения (должно быть 'ожидает')
+    assert trade["status"] == "ожидает"
+
+    # Меняем статус предложения на 'принята' от имени получателя (receiver)
+    update_payload = {"status": "принята"}
+
+    patch_resp = await client.patch(
+        f"/offers/{offer_id}", json=update_payload, headers=receiver_headers
+    )
+    assert patch_resp.status_code == 200
+
+    updated_trade = patch_resp.json()
+    assert updated_trade["id"] == offer_id
+    assert updated_trade["status"] == "принята"
+
+    # Проверяем, что нельзя изменить статус от имени не получателя (sender)
+    forbidden_resp = await client.patch(
+        f"/offers/{offer_id}", json={"status": "отклонена"}, headers=sender_headers
+    )
+    assert forbidden_resp.status_code == 403
+
+
+async def test_goods_redis_cache(client, auth, monkeypatch):
+    fake_redis = FakeRedis()
+    monkeypatch.setattr(db_requests, "redis_client", fake_redis)
+
+    auth_headers = await auth("cache_owner", "cachepass")
+    good_data = {**OWNED_GOOD, "category": "cache_category"}
+    response = await client.post("/goods/", json=good_data, headers=auth_headers)
+    good_id = response.json()["goods"]["id"]
+    params = {"category": "cache_category"}
+
+    # Первые запросы кладут товар и список в кэш
+    assert (await client.get(f"/goods/{good_id}")).json()["title"] == "Original Title"
+    response = await client.get("/goods/", params=params)
+    assert [good["title"] for good in response.json()] == ["Original Title"]
+    assert f"good:{good_id}" in fake_redis.store
+    assert any(key.startswith("goods:") for key in fake_redis.store)
+
+    # Меняем БД в обход API: ответы по-прежнему берутся из кэша
+    async with async_session_for_test() as db:
+        await db.execute(
+            update(GoodsORM).where(GoodsORM.id == good_id).values(title="Stale")
         )
-        assert forbidden_resp.status_code == 403
+        await db.commit()
+    assert (await client.get(f"/goods/{good_id}")).json()["title"] == "Original Title"
+    response = await client.get("/goods/", params=params)
+    assert [good["title"] for good in response.json()] == ["Original Title"]
+
+    # PATCH сбрасывает кэш товара и списков
+    response = await client.patch(
+        f"/goods/{good_id}", json={"title": "Updated Title"}, headers=auth_headers
+    )
+    assert response.status_code == 200
+    assert (await client.get(f"/goods/{good_id}")).json()["title"] == "Updated Title"
+    response = await client.get("/goods/", params=params)
+    assert [good["title"] for good in response.json()] == ["Updated Title"]
+
+    # DELETE тоже сбрасывает кэш
+    response = await client.delete(f"/goods/{good_id}", headers=auth_headers)
+    assert response.status_code == 200
+    assert f"good:{good_id}" not in fake_redis.store
+    assert (await client.get("/goods/", params=params)).json() == []
+
+
+async def test_goods_without_redis(client, auth, monkeypatch):
+    # Сбой кэша не должен ронять эндпоинты: чтения идут в БД, сброс пропускается
+    monkeypatch.setattr(db_requests, "redis_client", BrokenRedis())
+
+    auth_headers = await auth("nocache_owner", "nocachepass")
+    good_data = {**OWNED_GOOD, "category": "nocache_category"}
+    response = await client.post("/goods/", json=good_data, headers=auth_headers)
+    assert response.status_code == 200
+    good_id = response.json()["goods"]["id"]
+
+    response = await client.get("/goods/", params={"category": "nocache_category"})
+    assert response.status_code == 200
+    assert [good["id"] for good in response.json()] == [good_id]
+
+    response = await client.get(f"/goods/{good_id}")
+    assert response.status_code == 200
+
+    response = await client.patch(
+        f"/goods/{good_id}", json={"title": "Updated Title"}, headers=auth_headers
+    )
+    assert response.status_code == 200
+
+    response = await client.delete(f"/goods/{good_id}", headers=auth_headers)
+    assert response.status_code == 200